@@ -1,13 +1,15 @@
 import streamlit as st
 import os
+import pickle
 import tempfile
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-import base64
+import hashlib
+import shutil
+import threading
+from collections import OrderedDict
 from io import BytesIO
-from PIL import Image
-import numpy as np
+
+# pandas, numpy and matplotlib are imported where they are used. Before a document
+# is uploaded the landing page only loads pandas, for the sample chart
 
 # Import our DocumentAnalyzer class
 # Make sure to place the DocumentAnalyzer class in a separate file named document_analyzer.py
@@ -33,180 +35,365 @@ This application analyzes PDF and Word documents to extract information about:
 # File uploader
 uploaded_file = st.file_uploader("Upload a PDF or Word document", type=["pdf", "docx"])
 
-# Function to create a downloadable link for plot
-def get_image_download_link(fig, filename, text):
+# On-screen charts don't benefit from print resolution; the browser scales them down
+SCREEN_DPI = 100
+DOWNLOAD_DPI = 300
+
+# Charts are built as standalone Figures (not registered with pyplot) for each cached PNG,
+# so they are garbage collected once rendered; these bound how many cached images stay alive
+FIGURE_CACHE_ENTRIES = 8
+PALETTE_CACHE_ENTRIES = 64
+
+# Pixel size of the dominant color palette strips
+PALETTE_WIDTH = 1000
+PALETTE_HEIGHT = 100
+PALETTE_TITLE_HEIGHT = 30
+
+# WebP can't encode images taller than 16383 px, so palettes are split into sheets of at most this many rows
+PALETTES_PER_SHEET = 16383 // (PALETTE_TITLE_HEIGHT + PALETTE_HEIGHT)
+
+# Palette sheets are cached as encoded PNG/WebP bytes rather than RGB images; this bounds how many
+PALETTE_SHEET_CACHE_ENTRIES = 16
+
+# Font sizes for the palette percentage labels and image titles
+PALETTE_LABEL_SIZE = PALETTE_HEIGHT // 4
+PALETTE_TITLE_SIZE = PALETTE_TITLE_HEIGHT * 2 // 3
+
+# Number of analysis results kept by digest for identical re-uploads
+RESULTS_LRU_SIZE = 16
+
+# Number of characters shown in the text sample
+TEXT_SAMPLE_CHARS = 500
+
+# Render a figure as PNG bytes
+def _render_png(fig, dpi):
     buf = BytesIO()
-    fig.savefig(buf, format="png", dpi=300, bbox_inches='tight')
-    buf.seek(0)
-    b64 = base64.b64encode(buf.read()).decode()
-    href = f'<a href="data:image/png;base64,{b64}" download="{filename}">📥 {text}</a>'
-    return href
+    fig.savefig(buf, format="png", dpi=dpi, bbox_inches='tight')
+    return buf.getvalue()
+
+# Hash an upload in 1 MiB chunks, without copying it or touching the disk
+def _hash_upload(uploaded_file):
+    h = hashlib.blake2b(digest_size=16)
+    uploaded_file.seek(0)
+    for chunk in iter(lambda: uploaded_file.read(1 << 20), b''):
+        h.update(chunk)
+    return h.hexdigest()
 
-# Display dominant colors
-def display_color_palette(colors):
-    if not colors:
-        return None
+# Analyze an upload; only called by _analyze_cached on a cache miss
+def _analyze_file(suffix: str, uploaded_file) -> dict:
+    # Stream the upload to a temporary file in 1 MiB chunks
+    uploaded_file.seek(0)
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp_file:
+        shutil.copyfileobj(uploaded_file, tmp_file, length=1 << 20)
+        tmp_filepath = tmp_file.name
     
-    # Extract RGB values and counts
-    rgb_values = [color['rgb'] for color in colors]
-    counts = [color['count'] for color in colors]
+    try:
+        analyzer = DocumentAnalyzer()
+        results = analyzer.analyze_document(tmp_filepath)
+    finally:
+        # Clean up the temporary file
+        os.unlink(tmp_filepath)
+    
+    # Only keep the head of the text that the UI shows, rather than caching the whole document text
+    sample = analyzer.text_content[:TEXT_SAMPLE_CHARS]
+    text_sample = sample + ("..." if len(analyzer.text_content) > TEXT_SAMPLE_CHARS else "")
+    
+    # Only return plain data; the analyzer object itself is not cacheable
+    return {'results': results, 'text_sample': text_sample}
+
+# Process-wide LRU of analysis results keyed by upload digest, so reruns and re-uploads of
+# the same file skip the analyzer (and any disk I/O) even across sessions. Globals in this
+# script are reset on every rerun, so the dict and its lock live in the resource cache instead
+@st.cache_resource(show_spinner=False)
+def _results_lru():
+    return OrderedDict(), threading.Lock()
+
+def _analyze_cached(digest, suffix, uploaded_file):
+    lru, lock = _results_lru()
+    with lock:
+        blob = lru.get(digest)
+        if blob is not None:
+            lru.move_to_end(digest)
+    
+    if blob is None:
+        # Results are stored pickled, so the LRU holds one immutable copy of each
+        blob = pickle.dumps(_analyze_file(suffix, uploaded_file))
+        with lock:
+            lru[digest] = blob
+            lru.move_to_end(digest)
+            while len(lru) > RESULTS_LRU_SIZE:
+                lru.popitem(last=False)
+    
+    # Every caller gets its own copy, as with st.cache_data, so sessions can't mutate each other's results
+    return pickle.loads(blob)
+
+# Text statistics bar chart
+def _text_stats_fig(words: int, chars: int, paras: int):
+    import matplotlib
+    from matplotlib.figure import Figure
+    import numpy as np
+    
+    text_data = {
+        'Metric': ['Words', 'Characters', 'Paragraphs'],
+        'Count': [words, chars, paras]
+    }
+    
+    fig = Figure(figsize=(10, 5))
+    ax = fig.add_subplot(111)
+    ax.bar(text_data['Metric'], text_data['Count'], color=matplotlib.colormaps['viridis'](np.linspace(0.2, 0.8, 3)))
+    ax.set_title('Document Text Statistics')
+    
+    return fig
+
+# Image color distribution bar chart
+def _color_dist_fig(c: int, g: int, bw: int):
+    from matplotlib.figure import Figure
+    
+    color_data = {
+        'Type': ['Color', 'Grayscale', 'Black & White'],
+        'Count': [c, g, bw]
+    }
+    
+    fig = Figure(figsize=(10, 5))
+    ax = fig.add_subplot(111)
+    colors = ['#ff9999', '#66b3ff', '#99ff99']
+    
+    bars = ax.bar(color_data['Type'], color_data['Count'], color=colors)
+    
+    # Add percentage labels on top of each bar
+    total = sum(color_data['Count'])
+    for bar, count in zip(bars, color_data['Count']):
+        percentage = 100 * count / total if total > 0 else 0
+        ax.annotate(f'{percentage:.1f}%', 
+                    (bar.get_x() + bar.get_width() / 2., bar.get_height()), 
+                    ha='center', va='bottom', fontsize=12)
+    
+    ax.set_title('Image Color Distribution')
+    
+    return fig
+
+# Chart PNGs, cached on the chart inputs and resolution so each is encoded once.
+# Each call renders its own Figure, so concurrent sessions never share one
+@st.cache_data(max_entries=FIGURE_CACHE_ENTRIES, show_spinner=False)
+def _text_stats_png(words: int, chars: int, paras: int, dpi: int = DOWNLOAD_DPI) -> bytes:
+    return _render_png(_text_stats_fig(words, chars, paras), dpi=dpi)
+
+@st.cache_data(max_entries=FIGURE_CACHE_ENTRIES, show_spinner=False)
+def _color_dist_png(c: int, g: int, bw: int, dpi: int = DOWNLOAD_DPI) -> bytes:
+    return _render_png(_color_dist_fig(c, g, bw), dpi=dpi)
+
+# Dominant colors of one image as arrays: rgb (k, 3) uint8 and counts (k,) int64.
+# Accepts that layout directly, or the older list of {'rgb', 'count'} dicts under 'colors'
+def _palette_arrays(color_info):
+    import numpy as np
+    
+    if 'counts' in color_info:
+        rgb = np.asarray(color_info['rgb'], dtype=np.uint8).reshape(-1, 3)
+        counts = np.asarray(color_info['counts'], dtype=np.int64)
+    else:
+        colors = color_info['colors']
+        rgb = np.array([color['rgb'] for color in colors], dtype=np.uint8).reshape(-1, 3)
+        counts = np.fromiter((color['count'] for color in colors), dtype=np.int64, count=len(colors))
+    return rgb, counts
+
+# Group the dominant colors of all images into sheets of at most PALETTES_PER_SHEET palettes
+def _palette_sheets(dominant_colors):
+    palettes = tuple(
+        (f"Image #{color_info['image_index'] + 1}", *_palette_arrays(color_info))
+        for color_info in dominant_colors
+    )
+    # Skip images without any dominant colors
+    palettes = tuple(palette for palette in palettes if len(palette[2]))
+    
+    return [palettes[i:i + PALETTES_PER_SHEET] for i in range(0, len(palettes), PALETTES_PER_SHEET)]
+
+# Color palette strip for one image, drawn directly with Pillow instead of matplotlib
+@st.cache_resource(max_entries=PALETTE_CACHE_ENTRIES, show_spinner=False)
+def _palette_image(rgb, counts):
+    from PIL import Image, ImageDraw, ImageFont
+    import numpy as np
     
     # Normalize counts to get percentages
-    total = sum(counts)
-    percentages = [count/total for count in counts]
-    
-    # Create a figure for the color palette
-    fig, ax = plt.subplots(figsize=(10, 2))
-    
-    # Create color bars
-    start = 0
-    for i, (rgb, percentage) in enumerate(zip(rgb_values, percentages)):
-        # Convert BGR to RGB (OpenCV uses BGR)
-        r, g, b = rgb
-        color = (r/255, g/255, b/255)
+    percentages = counts / counts.sum()
+    
+    # Build the palette as a single image strip, each color repeated by its share,
+    # then stretch it to a fixed width so palettes line up when stacked
+    widths = np.maximum(1, np.round(percentages * PALETTE_WIDTH).astype(int))
+    strip = np.repeat(rgb, widths, axis=0)[None, :, :]
+    img = Image.fromarray(strip).resize((PALETTE_WIDTH, PALETTE_HEIGHT), Image.NEAREST)
+    
+    # Pick label colors from Rec. 709 luminance so text stays readable on each color
+    lum = rgb.astype(np.float32) @ np.array([0.2126, 0.7152, 0.0722], dtype=np.float32)
+    use_white = lum < 140.0
+    
+    # Label centers follow the rounded widths so they line up with the strip
+    scale = PALETTE_WIDTH / widths.sum()
+    centers = (np.cumsum(widths) - widths / 2) * scale
+    
+    # Add percentage labels only where the share is significant enough (more than 5%)
+    draw = ImageDraw.Draw(img)
+    font = ImageFont.load_default(size=PALETTE_LABEL_SIZE)
+    significant = np.flatnonzero(percentages > 0.05)
+    for i in significant:
+        label = f"{percentages[i]:.1%}"
+        left, top, right, bottom = draw.textbbox((0, 0), label, font=font)
+        draw.text((centers[i] - (left + right) / 2, (PALETTE_HEIGHT - (top + bottom)) / 2), label,
+                  fill='white' if use_white[i] else 'black', font=font)
+    
+    return img
+
+# Palettes stacked into one image, each under its title, so they reach the browser in one payload
+def _palette_sheet(palettes: tuple):
+    from PIL import Image, ImageDraw, ImageFont
+    
+    row_height = PALETTE_TITLE_HEIGHT + PALETTE_HEIGHT
+    sheet = Image.new('RGB', (PALETTE_WIDTH, row_height * len(palettes)), 'white')
+    draw = ImageDraw.Draw(sheet)
+    font = ImageFont.load_default(size=PALETTE_TITLE_SIZE)
+    
+    for i, (title, rgb, counts) in enumerate(palettes):
+        top = i * row_height
+        _, text_top, _, text_bottom = draw.textbbox((0, 0), title, font=font)
+        draw.text((0, top + (PALETTE_TITLE_HEIGHT - (text_top + text_bottom)) / 2), title, fill='black', font=font)
+        sheet.paste(_palette_image(rgb, counts), (0, top + PALETTE_TITLE_HEIGHT))
+    
+    return sheet
+
+# Palette sheet encoded for display (PNG) or download (lossless WebP); both are exact,
+# and the large flat color areas compress to a few KB
+@st.cache_data(max_entries=PALETTE_SHEET_CACHE_ENTRIES, show_spinner=False)
+def _palette_sheet_bytes(palettes: tuple, fmt: str) -> bytes:
+    buf = BytesIO()
+    if fmt == 'WEBP':
+        _palette_sheet(palettes).save(buf, format='WEBP', lossless=True)
+    else:
+        _palette_sheet(palettes).save(buf, format=fmt)
+    return buf.getvalue()
+
+# Each tab is a fragment, so interacting with widgets inside one tab only reruns that tab
+
+@st.fragment
+def _tab_doc_info(results):
+    st.header("Document Information")
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        st.metric("Document Type", results['document_type'])
+        st.metric("Page Count", results['page_count'])
+        st.metric("Total Words", results['text_analysis']['word_count'])
+    
+    with col2:
+        st.metric("Total Characters", results['text_analysis']['char_count'])
+        st.metric("Paragraphs", results['text_analysis']['paragraph_count'])
+        st.metric("Images", results['image_analysis']['image_count'])
+
+@st.fragment
+def _tab_text(results, text_sample):
+    st.header("Text Analysis")
+    
+    # Word count visualization
+    st.subheader("Text Statistics")
+    text_counts = (
+        results['text_analysis']['word_count'],
+        results['text_analysis']['char_count'],
+        results['text_analysis']['paragraph_count']
+    )
+    st.image(_text_stats_png(*text_counts, dpi=SCREEN_DPI), width="stretch")
+    
+    # Provide download button for the plot; the PNG is only rendered on click
+    st.download_button(
+        "📥 Download Text Statistics Chart",
+        data=lambda: _text_stats_png(*text_counts),
+        file_name="text_stats.png",
+        mime="image/png",
+    )
+    
+    # Display text sample
+    st.subheader(f"Text Sample (first {TEXT_SAMPLE_CHARS} characters)")
+    st.text_area("", text_sample, height=200)
+
+@st.fragment
+def _tab_images(results):
+    import numpy as np
+    import pandas as pd
+    
+    st.header("Image Analysis")
+    
+    # Image color chart
+    color_summary = results['image_analysis']['color_summary']
+    
+    if results['image_analysis']['image_count'] > 0:
+        st.subheader("Image Color Distribution")
+        color_counts = (
+            color_summary['color'],
+            color_summary['grayscale'],
+            color_summary['black_white']
+        )
+        st.image(_color_dist_png(*color_counts, dpi=SCREEN_DPI), width="stretch")
         
-        end = start + percentage
-        ax.barh(0, percentage, left=start, color=color, height=1)
+        # Provide download button for the plot; the PNG is only rendered on click
+        st.download_button(
+            "📥 Download Image Color Chart",
+            data=lambda: _color_dist_png(*color_counts),
+            file_name="image_color_chart.png",
+            mime="image/png",
+        )
         
-        # Add percentage label if it's significant enough
-        if percentage > 0.05:  # Only show label if it's more than 5%
-            text_x = start + percentage/2
-            ax.text(text_x, 0, f"{percentage:.1%}", 
-                    ha='center', va='center', 
-                    color='white' if sum(rgb) < 380 else 'black',
-                    fontweight='bold')
+        # Display image info in a table
+        st.subheader("Image Information")
+        imgs = results['image_analysis']['images']
+        image_data = pd.DataFrame({
+            'Index': np.fromiter((img['index'] + 1 for img in imgs), dtype=np.int32, count=len(imgs)),
+            'Dimensions': [img['dimensions'] for img in imgs],
+            'Format': [img['format'].upper() for img in imgs],
+            'Page': [img.get('page', 'N/A') for img in imgs]
+        })
         
-        start = end
-    
-    ax.set_xlim(0, 1)
-    ax.set_ylim(-0.5, 0.5)
-    ax.axis('off')
-    
-    return fig
+        st.dataframe(image_data, width="stretch")
+        
+        # Display dominant colors if available
+        if 'dominant_colors' in results['image_analysis'] and results['image_analysis']['dominant_colors']:
+            st.subheader("Dominant Colors")
+            
+            sheets = _palette_sheets(results['image_analysis']['dominant_colors'])
+            for i, palettes in enumerate(sheets):
+                # Send the palettes as PNG; Streamlit would otherwise JPEG-encode them
+                st.image(_palette_sheet_bytes(palettes, 'PNG'), width="stretch", output_format="PNG")
+                
+                # Documents with many images get one download per sheet
+                part = f" ({i + 1}/{len(sheets)})" if len(sheets) > 1 else ""
+                st.download_button(
+                    "📥 Download Color Palettes" + part,
+                    data=lambda palettes=palettes: _palette_sheet_bytes(palettes, 'WEBP'),
+                    file_name=f"color_palettes_{i + 1}.webp" if len(sheets) > 1 else "color_palettes.webp",
+                    mime="image/webp",
+                    key=f"palette_sheet_{i}",
+                )
+    else:
+        st.info("No images found in the document.")
 
 if uploaded_file is not None:
     # Display a spinner while processing
     with st.spinner('Analyzing document...'):
-        # Save the uploaded file to a temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(uploaded_file.name)[1]) as tmp_file:
-            tmp_file.write(uploaded_file.getvalue())
-            tmp_filepath = tmp_file.name
-        
         try:
-            # Initialize the analyzer
-            analyzer = DocumentAnalyzer()
+            # Analyze the document (cached on the file's content digest)
+            digest = _hash_upload(uploaded_file)
+            analysis = _analyze_cached(digest, os.path.splitext(uploaded_file.name)[1], uploaded_file)
             
-            # Analyze the document
-            results = analyzer.analyze_document(tmp_filepath)
-            
-            # Clean up the temporary file
-            os.unlink(tmp_filepath)
+            results = analysis['results']
+            text_sample = analysis['text_sample']
             
             # Display results in tabs
             tab1, tab2, tab3 = st.tabs(["Document Info", "Text Analysis", "Image Analysis"])
             
             with tab1:
-                st.header("Document Information")
-                col1, col2 = st.columns(2)
-                
-                with col1:
-                    st.metric("Document Type", results['document_type'])
-                    st.metric("Page Count", results['page_count'])
-                    st.metric("Total Words", results['text_analysis']['word_count'])
-                
-                with col2:
-                    st.metric("Total Characters", results['text_analysis']['char_count'])
-                    st.metric("Paragraphs", results['text_analysis']['paragraph_count'])
-                    st.metric("Images", results['image_analysis']['image_count'])
+                _tab_doc_info(results)
             
             with tab2:
-                st.header("Text Analysis")
-                
-                # Word count visualization
-                st.subheader("Text Statistics")
-                text_data = {
-                    'Metric': ['Words', 'Characters', 'Paragraphs'],
-                    'Count': [
-                        results['text_analysis']['word_count'],
-                        results['text_analysis']['char_count'],
-                        results['text_analysis']['paragraph_count']
-                    ]
-                }
-                
-                fig, ax = plt.subplots(figsize=(10, 5))
-                sns.barplot(x='Metric', y='Count', data=pd.DataFrame(text_data), palette='viridis')
-                ax.set_title('Document Text Statistics')
-                st.pyplot(fig)
-                
-                # Provide download link for the plot
-                st.markdown(get_image_download_link(fig, "text_stats.png", "Download Text Statistics Chart"), unsafe_allow_html=True)
-                
-                # Display text sample
-                st.subheader("Text Sample (first 500 characters)")
-                text_sample = analyzer.text_content[:500] + "..." if len(analyzer.text_content) > 500 else analyzer.text_content
-                st.text_area("", text_sample, height=200)
+                _tab_text(results, text_sample)
             
             with tab3:
-                st.header("Image Analysis")
-                
-                # Image color chart
-                color_summary = results['image_analysis']['color_summary']
-                
-                if results['image_analysis']['image_count'] > 0:
-                    st.subheader("Image Color Distribution")
-                    
-                    color_data = {
-                        'Type': ['Color', 'Grayscale', 'Black & White'],
-                        'Count': [
-                            color_summary['color'],
-                            color_summary['grayscale'],
-                            color_summary['black_white']
-                        ]
-                    }
-                    
-                    fig, ax = plt.subplots(figsize=(10, 5))
-                    colors = ['#ff9999', '#66b3ff', '#99ff99']
-                    
-                    bars = sns.barplot(x='Type', y='Count', data=pd.DataFrame(color_data), palette=colors)
-                    
-                    # Add percentage labels on top of each bar
-                    total = sum(color_data['Count'])
-                    for i, p in enumerate(bars.patches):
-                        percentage = 100 * color_data['Count'][i] / total if total > 0 else 0
-                        bars.annotate(f'{percentage:.1f}%', 
-                                    (p.get_x() + p.get_width() / 2., p.get_height()), 
-                                    ha='center', va='bottom', fontsize=12)
-                    
-                    ax.set_title('Image Color Distribution')
-                    st.pyplot(fig)
-                    
-                    # Provide download link for the plot
-                    st.markdown(get_image_download_link(fig, "image_color_chart.png", "Download Image Color Chart"), unsafe_allow_html=True)
-                    
-                    # Display image info in a table
-                    st.subheader("Image Information")
-                    image_data = [
-                        {
-                            'Index': img['index'] + 1,
-                            'Dimensions': img['dimensions'],
-                            'Format': img['format'].upper(),
-                            'Page': img.get('page', 'N/A')
-                        } for img in results['image_analysis']['images']
-                    ]
-                    
-                    st.dataframe(pd.DataFrame(image_data), use_container_width=True)
-                    
-                    # Display dominant colors if available
-                    if 'dominant_colors' in results['image_analysis'] and results['image_analysis']['dominant_colors']:
-                        st.subheader("Dominant Colors")
-                        
-                        for color_info in results['image_analysis']['dominant_colors']:
-                            st.markdown(f"**Image #{color_info['image_index'] + 1}**")
-                            fig = display_color_palette(color_info['colors'])
-                            if fig:
-                                st.pyplot(fig)
-                else:
-                    st.info("No images found in the document.")
+                _tab_images(results)
                 
         except Exception as e:
             st.error(f"Error analyzing document: {str(e)}")
@@ -234,12 +421,16 @@ else:
         - **Black & White Images:** 1 (12.5%)
         """)
         
-        # Create a sample chart
-        fig, ax = plt.subplots(figsize=(10, 5))
-        sample_data = pd.DataFrame({
-            'Type': ['Color', 'Grayscale', 'Black & White'],
-            'Count': [5, 2, 1]
-        })
-        sns.barplot(x='Type', y='Count', data=sample_data, palette=['#ff9999', '#66b3ff', '#99ff99'])
-        ax.set_title('Sample Image Color Distribution')
-        st.pyplot(fig)
\ No newline at end of file
+        # Create a sample chart; st.bar_chart is drawn in the browser, so the landing page needs no matplotlib
+        import pandas as pd
+        
+        st.markdown("**Sample Image Color Distribution**")
+        types = ['Color', 'Grayscale', 'Black & White']
+        counts = [5, 2, 1]
+        # One column per type (zero on the other rows), so each bar takes its own color from the list;
+        # this keeps the order and colors of the real Image Color Distribution chart
+        sample_data = pd.DataFrame(
+            {t: [count if t == row else 0 for row in types] for t, count in zip(types, counts)},
+            index=types
+        )
+        st.bar_chart(sample_data, color=['#ff9999', '#66b3ff', '#99ff99'], x_label='Type', y_label='Count', sort=False)